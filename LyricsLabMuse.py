@@ -1,42 +1,136 @@
+import os
+
+# Read by the CUDA caching allocator on its first allocation, which any loader
+# (sentence-transformers, transformers, MusicGen) may trigger: set it before
+# anything imports torch. Growable segments avoid fragmentation over generations
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:512")
+
 from PyQt5.QtWidgets import (QApplication, QWidget, QLabel, QLineEdit,
-                             QVBoxLayout, QPushButton,
-                             QFrame, QMessageBox, QTextEdit,QComboBox,
-                             QScrollArea, QProgressDialog, QStyle, QHBoxLayout, QFileDialog
+                             QVBoxLayout, QFormLayout, QPushButton,
+                             QMessageBox, QPlainTextEdit,QComboBox,
+                             QProgressDialog, QStyle, QHBoxLayout, QFileDialog
                              )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, QThreadPool
+from PyQt5.QtGui import QTextCursor
 import logging
+import queue
 import sys
-import os
 
 sys.path.append(os.path.abspath(
     os.path.join(os.path.dirname(__file__), "../../")))
 
-from src.gui.components.stream_thread import StreamThread
+from src.gui.components.stream_task import StreamTask
 from src.gui.components.audio_thread import AudioGenerationThread
 from src.gui.components.audio_controls import AudioControls
+from src.gui.components.audio_data_runnable import AudioDataRunnable
+from src.gui.components.export_runnable import ExportRunnable
+from src.gui.components.llm_warmer import LlmWarmer
+from src.gui.components.model_loader import ModelLoader
+from src.gui.components.rag_prefetcher import RagPrefetcher
 from src.gui.components.themes import apply_dark_theme, apply_light_theme
-from src.core.audiocraft_generator import AudiocraftGenerator
 from src.core.music_composition_export_formatter import MusicCompositionExportFormatter
-from src.core.rag_helper import MusicStructureRAG
-from src.core.obscene_filter import ObsceneFilter
+
+
+def create_song_generator():
+    # Import here so torch/audiocraft load only when the model is needed
+    from src.core.audiocraft_generator import AudiocraftGenerator
+    song_generator = AudiocraftGenerator()
+    song_generator.load()
+    return song_generator
+
+
+def create_obscene_filter():
+    # Import here so the transformers classifier loads off the GUI thread
+    from src.core.obscene_filter import ObsceneFilter
+    return ObsceneFilter()
+
+
+def create_music_composer():
+    # Import here so the openai client is not imported before the window is shown
+    from src.core.music_composition_experts import MusicCompositionExperts
+    return MusicCompositionExperts()
+
+
+def create_rag():
+    # Import here so the embeddings and vector store load off the GUI thread
+    from src.core.rag_helper import MusicStructureRAG, CachedMusicStructureRAG
+    return CachedMusicStructureRAG(MusicStructureRAG())
+
 
 class ModernInterface(QWidget):
     def __init__(self):
         super().__init__()
-        try:
-            self.song_generator = AudiocraftGenerator()
-        except Exception as e:
-            QMessageBox.critical(self, "Initialization Error",
-                                 f"Failed to initialize audio generator: {str(e)}")
-            return
-        self.rag = MusicStructureRAG()
-        self.ObsceneFilter = ObsceneFilter()
+        # The audio model is loaded in the background, see ModelLoader
+        self.song_generator = None
+        self._song_generator_loading = False
+        # Loaded in the background too, see _load_rag
+        self.rag = None
+        self._rag_loading = False
+        # Loaded once the window is shown, see on_obscene_filter_loaded
+        self.ObsceneFilter = None
+        self._obscene_filter_loading = False
+        # Shared by every streaming thread, so its LLM client is reused;
+        # created once the window is shown, see initialize_composer
+        self.music_composer = None
         self.MusicExportFormatter = MusicCompositionExportFormatter()
         self.dark_mode = False
-        self.streaming_thread = None
+        self.streaming_task = None
+        self.audio_thread = None
+        self._audio_preparation = None
+        # Cancelled threads still running, kept alive until they finish
+        self._stopping_threads = []
         self.audio_controls = None
+
+        # Streamed chunks are queued by StreamTask and drained at ~60 Hz
+        self._stream_queue = None
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setInterval(16)
+        self._flush_timer.timeout.connect(self.flush_stream_buffer)
+
+        # Every chunk received for the current composition
+        self._composition_buffer = []
+
         self.initUI()
 
+        # Progress dialog shared by every audio generation
+        self.progress = QProgressDialog(
+            "Preparing audio generation...", "Cancel", 0, 100, self)
+        self.progress.setWindowTitle("Generating Audio")
+        self.progress.setWindowModality(Qt.WindowModal)
+        self.progress.setAutoClose(True)
+        self.progress.setAutoReset(True)
+        self.progress.setMinimumDuration(0)
+        self.progress.setMinimumWidth(300)
+        self.progress.reset()
+        self.progress.hide()
+
+        # Warning box reused by every check, see _warn
+        self._warning_box = QMessageBox(self)
+        self._warning_box.setIcon(QMessageBox.Warning)
+
+        # Long startup jobs (model loads, warm-up, prefetch) get their own pool,
+        # so composition streams and exports never queue behind them
+        self._loader_pool = QThreadPool(self)
+        self._loader_pool.setMaxThreadCount(3)
+
+        # Load the audio model in the thread pool once the UI is visible,
+        # audio generation is enabled when it is ready
+        self.bouton_generer_audio.setEnabled(False)
+        self._song_generator_loading = True
+        loader = ModelLoader(create_song_generator)
+        loader.signals.loaded.connect(self.on_song_generator_loaded)
+        loader.signals.failed.connect(self.on_song_generator_failed)
+        self._loader_pool.start(loader)
+
+        # Load the RAG and prefetch the structures of the dropdown styles
+        self._load_rag()
+
+        # Load the obscenity classifier in the background as well
+        self._load_obscene_filter()
+
+        # Build the LLM client after the first paint of the window
+        QTimer.singleShot(0, self.initialize_composer)
+
         # TODO test
         # self.media_player = QMediaPlayer()
 
@@ -51,16 +145,9 @@ class ModernInterface(QWidget):
             # Start the app normal
             self.showNormal()
 
-            main_layout = QVBoxLayout()
-
-            # Create a scroll area for the entire content
-            scroll_area = QScrollArea()
-            scroll_area.setWidgetResizable(True)
-            scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
-
-            # Create a frame to hold the content
-            content_frame = QFrame()
-            content_layout = QVBoxLayout(content_frame)
+            # Widgets laid out directly on the window, the composition
+            # field is the only tall widget and scrolls by itself
+            content_layout = QVBoxLayout()
 
             self.create_title(content_layout)
             self.create_input_sections(content_layout)
@@ -72,9 +159,7 @@ class ModernInterface(QWidget):
             # Add audio controls here
             self.setup_audio(content_layout)  # Pass the layout as parameter
 
-            scroll_area.setWidget(content_frame)
-            main_layout.addWidget(scroll_area)
-            self.setLayout(main_layout)
+            self.setLayout(content_layout)
 
             apply_dark_theme(self)
         except Exception as e:
@@ -85,64 +170,39 @@ class ModernInterface(QWidget):
     def create_title(self, layout):
         titre = QLabel('LyricsLabMuse')
         titre.setAlignment(Qt.AlignCenter)
-        titre.setStyleSheet("""
-            font-size: 24px;
-            font-weight: bold;
-            margin-bottom: 20px;
-        """)
+        titre.setObjectName('title')
         layout.addWidget(titre)
 
 
     def create_input_sections(self, layout):
+        # Un seul QFormLayout pour les quatre champs, libellés au-dessus des champs
+        form = QFormLayout()
+        form.setRowWrapPolicy(QFormLayout.WrapAllRows)
         self.text_fields = []
         labels = ['Musical Style', 'Song Theme', 'Mood', 'Language']
-        for label in labels:
-            if label == 'Musical Style':
-                section_layout, field = self.create_dropdown_section(label)
+        for label_text in labels:
+            label = QLabel(label_text)
+            label.setObjectName('sectionLabel')
+            if label_text == 'Musical Style':
+                field = QComboBox()
+                field.addItems(['Pop', 'Rock', 'Rap', 'EDM', 'Blues', 'Country', 'Jazz', 'Reggae', 'R&B'])
             else:
-                section_layout, field = self.create_input_section(label)
-            layout.addLayout(section_layout)
+                field = QLineEdit()
+                field.setPlaceholderText(f'Entrez votre {label_text.lower()}')
+            form.addRow(label, field)
             self.text_fields.append(field)
-
-
-    def create_dropdown_section(self, label_text):
-        section_layout = QVBoxLayout()
-        label = QLabel(label_text)
-        label.setStyleSheet("""
-            font-weight: bold;
-            margin-bottom: 5px;
-        """)
-        dropdown = QComboBox()
-        dropdown.addItems(['Pop', 'Rock', 'Rap', 'EDM', 'Blues', 'Country', 'Jazz', 'Reggae', 'R&B'])
-
-        section_layout.addWidget(label)
-        section_layout.addWidget(dropdown)
-        return section_layout, dropdown
-    
-
-    def create_input_section(self, label_text):
-        section_layout = QVBoxLayout()
-        label = QLabel(label_text)
-        label.setStyleSheet("""
-            font-weight: bold;
-            margin-bottom: 5px;
-        """)
-        input_field = QLineEdit()
-        input_field.setPlaceholderText(f'Entrez votre {label_text.lower()}')
-
-        section_layout.addWidget(label)
-        section_layout.addWidget(input_field)
-        return section_layout, input_field
+        layout.addLayout(form)
 
     def create_full_composition_section(self, layout):
         full_composition_label = QLabel('Composition Complète Générée')
-        full_composition_label.setStyleSheet("""
-            font-weight: bold;
-            margin-bottom: 5px;
-        """)
+        full_composition_label.setObjectName('sectionLabel')
 
-        self.full_composition_field = QTextEdit()
+        self.full_composition_field = QPlainTextEdit()
         self.full_composition_field.setReadOnly(True)
+        # Champ en ajout seul : pas d'historique d'annulation
+        self.full_composition_field.setUndoRedoEnabled(False)
+        # Borne la mémoire du document, le texte complet reste dans _composition_buffer
+        self.full_composition_field.setMaximumBlockCount(2000)
         self.full_composition_field.setPlaceholderText(
             'La composition complète sera générée ici')
 
@@ -169,61 +229,90 @@ class ModernInterface(QWidget):
         layout.addWidget(self.bouton_generer_composition)
         layout.addWidget(self.bouton_generer_audio)
 
+        # La composition n'est possible que si tous les champs sont remplis
+        for field in self.text_fields[1:]:
+            field.textChanged.connect(self._revalidate)
+        self._revalidate()
+
+    def _revalidate(self):
+        """Enable the composition button only when every field is filled"""
+        # Same check as _validated_song_info
+        self.bouton_generer_composition.setEnabled(all(self.get_song_info()))
+
 
     def get_song_info(self):
-        musicalStyle = self.text_fields[0].currentText()
-        songTheme = self.text_fields[1].text()
-        mood = self.text_fields[2].text()
-        language = self.text_fields[3].text()
+        """Field values without surrounding whitespace, a blank field is empty"""
+        musicalStyle = self.text_fields[0].currentText().strip()
+        songTheme = self.text_fields[1].text().strip()
+        mood = self.text_fields[2].text().strip()
+        language = self.text_fields[3].text().strip()
         
         return musicalStyle, songTheme, mood, language
     
 
+    def _warn(self, title, text):
+        """Show a warning through the reused message box"""
+        self._warning_box.setWindowTitle(title)
+        self._warning_box.setText(text)
+        self._warning_box.exec_()
+
+    def _validated_song_info(self):
+        """Song info, or None after warning that a field is empty"""
+        song_info = self.get_song_info()
+        if not all(song_info):
+            self._warn("Error", "Please fill in all empty fields")
+            return None
+        return song_info
+
     def generer_full_composition(self):
         """Generate full composition with improved RAG integration"""
-        # Récupérer les informations nécessaires
+        # Les champs sont validés à la saisie, voir _revalidate
         musicalStyle, songTheme, mood, language = self.get_song_info()
 
-        # Validate inputs
-        if not all([musicalStyle, songTheme, mood, language]):
-            QMessageBox.warning(
-                self, "Error", "Please fill in all empty fields")
+        if self.ObsceneFilter is None and not self._obscene_filter_loading:
+            # Background loading failed, retry it off the GUI thread
+            self._load_obscene_filter(report_failure=True)
+        if self.rag is None and not self._rag_loading:
+            self._load_rag(report_failure=True)
+        if (self._obscene_filter_loading or self._rag_loading
+                or self.music_composer is None):
+            QMessageBox.information(self, "Loading", "Modèle en cours de chargement...")
             return
-        
+
         # Validate obscene language
-        if(any(
-            self.ObsceneFilter.is_obscene(item)
-            for item in [songTheme, mood, language]
-        )):
-            QMessageBox.warning(
-                self, "Error", "Please avoid using obscene language")
+        if self.ObsceneFilter.are_any_obscene([songTheme, mood, language]):
+            self._warn("Error", "Please avoid using obscene language")
             return 
         
         try:
-            # Get structure using new RAG
-            structure = self.rag.query_rag(musicalStyle)
-
             # Reset the composition field
+            self._composition_buffer.clear()
             self.full_composition_field.clear()
-
-            # Stop any existing streaming thread
-            if self.streaming_thread and self.streaming_thread.isRunning():
-                self.streaming_thread.terminate()
-
-            # Create and start new streaming thread
-            self.streaming_thread = StreamThread(
+            self.full_composition_field.setPlaceholderText(
+                'Récupération de la structure...')
+
+            # Stop any existing streaming task
+            if self.streaming_task is not None:
+                self._stop_streaming_task(self.streaming_task)
+
+            # Create and start a new streaming task in the thread pool,
+            # the RAG structure is retrieved inside the task. Each task gets
+            # its own queue, so chunks of a cancelled one are never shown
+            self._stream_queue = queue.SimpleQueue()
+            self.streaming_task = StreamTask(
+                self.music_composer,
                 'generate_song_composition',
+                self.rag,
+                self._stream_queue,
                 musicalStyle,
-                structure,  # Pass the RAG-generated structure
                 songTheme,
                 mood,
                 language
             )
-            self.streaming_thread.chunk_ready.connect(
-                self.update_full_composition_streaming)
-            self.streaming_thread.stream_complete.connect(
-                self.on_stream_complete)
-            self.streaming_thread.start()
+            signals = self.streaming_task.signals
+            signals.rag_ready.connect(self.on_rag_ready)
+            QThreadPool.globalInstance().start(self.streaming_task)
+            self._flush_timer.start()
 
         except Exception as e:
             QMessageBox.critical(
@@ -232,20 +321,55 @@ class ModernInterface(QWidget):
                 f"Failed to generate composition: {str(e)}"
             )
 
-    def update_full_composition_streaming(self, chunk):
-        # Ajouter le nouveau morceau au texte existant
-        current_text = self.full_composition_field.toPlainText()
-        self.full_composition_field.setText(current_text + chunk)
+    def _composition_text(self):
+        """Text of the current composition, joined once and kept as a single chunk"""
+        if len(self._composition_buffer) > 1:
+            self._composition_buffer[:] = [''.join(self._composition_buffer)]
+        return self._composition_buffer[0] if self._composition_buffer else ''
+
+    def flush_stream_buffer(self):
+        # Vider la file remplie par StreamTask, en un seul ajout au champ
+        parts = []
+        finished = False
+        while True:
+            try:
+                chunk = self._stream_queue.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                finished = True
+                break
+            parts.append(chunk)
+        if finished:
+            self.on_stream_complete()
+        if not parts:
+            return
+        text = ''.join(parts)
+        self._composition_buffer.append(text)
 
-        # Faire défiler automatiquement vers le bas
-        self.full_composition_field.verticalScrollBar().setValue(
-            self.full_composition_field.verticalScrollBar().maximum()
-        )
+        # Lu avant l'ajout, sur la mise en page déjà calculée
+        scroll_bar = self.full_composition_field.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 4
+
+        # Ajouter les morceaux reçus à la fin du texte existant,
+        # sans déplacer le curseur ni la vue de l'utilisateur
+        cursor = QTextCursor(self.full_composition_field.document())
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
 
+        # Défiler vers le bas seulement si l'utilisateur y était déjà
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+
+    def on_rag_ready(self, structure):
+        logging.debug(f"RAG structure: {structure}")
+        self.full_composition_field.setPlaceholderText(
+            'La composition complète sera générée ici')
 
     def on_stream_complete(self):
         # Vous pouvez ajouter un traitement supplémentaire une fois le streaming terminé
-        pass
+        self._flush_timer.stop()
 
     def toggle_theme(self):
         self.dark_mode = not self.dark_mode
@@ -258,82 +382,50 @@ class ModernInterface(QWidget):
         """Generate audio in a separate thread with proper error handling and data processing"""
         try:
             # Get input fields and validate
-            musical_style = self.text_fields[0].currentText()
-            song_theme = self.text_fields[1].text()
-            mood = self.text_fields[2].text()
-            language = self.text_fields[3].text()
-
-            if not all([musical_style, song_theme, mood, language]):
-                raise ValueError("All fields must be filled")
-
-            # Create progress dialog with smaller steps
-            self.progress = QProgressDialog(
-                "Preparing audio generation...", "Cancel", 0, 100, self)
-            self.progress.setWindowTitle("Generating Audio")
-            self.progress.setWindowModality(Qt.WindowModal)
-            self.progress.setAutoClose(True)
-            self.progress.setAutoReset(True)
-            self.progress.setMinimumDuration(0)  # Show immediately
-            self.progress.setValue(0)
-            self.progress.setMinimumWidth(300)
+            song_info = self._validated_song_info()
+            if song_info is None:
+                return
+            musical_style, _song_theme, mood, _language = song_info
 
-            # Get composition text and validate
-            composition_text = self.full_composition_field.toPlainText()
-            if not composition_text:
-                QMessageBox.warning(
-                    self, "Error", "Please generate composition first")
+            if self._song_generator_loading:
+                QMessageBox.information(
+                    self, "Audio Model", "The audio model is still loading, please try again shortly")
                 return
 
             try:
-                # Parse and format data
-                parsed_data = self.MusicExportFormatter.parse_composition(composition_text)
-
-                # Log parsed data for debugging
-                logging.debug(f"Parsed composition data: {parsed_data}")
-                print(parsed_data)
-                # Generate audio export metadata
-                formatted_data = self.MusicExportFormatter.generate_audio_export_metadata(
-                    lyrics=parsed_data.get('lyrics', {}),
-                    chord_progression=parsed_data.get('chord_progression', {}),
-                    song_structure=parsed_data.get('full_structure', {}),
-                    musical_style=musical_style,
-                    mood=mood
-                )
-
-                # Log formatted data for debugging
-                logging.debug(f"Formatted audio metadata: {formatted_data}")
-
-                # Validate formatted data structure
-                if not formatted_data.get('music_metadata'):
-                    raise ValueError("Missing required music metadata")
-
+                self._ensure_song_generator()
             except Exception as e:
-                logging.error(f"Data formatting error: {str(e)}")
-                QMessageBox.critical(
-                    self, "Formatting Error",
-                    f"Failed to process composition data: {str(e)}")
+                QMessageBox.critical(self, "Initialization Error",
+                                     f"Failed to initialize audio generator: {str(e)}")
                 return
 
-            # Create and configure audio generation thread
-            self.audio_thread = AudioGenerationThread(
-                self.song_generator, formatted_data)
-
-            # Connect signals
-            self.audio_thread.progress_updated.connect(
-                self.update_generation_progress)
-            self.audio_thread.generation_complete.connect(
-                self.handle_generation_complete)
-            self.audio_thread.generation_error.connect(
-                self.handle_generation_error)
-
-            # Connect cancel button
-            self.progress.canceled.connect(self.audio_thread.terminate)
+            # Get composition text and validate
+            composition_text = self._composition_text()
+            if not composition_text:
+                self._warn("Error", "Please generate composition first")
+                return
 
-            # Start generation
-            self.audio_thread.start()
+            # Reuse the progress dialog, detached from the previous generation
+            try:
+                self.progress.canceled.disconnect()
+            except TypeError:
+                pass
+            self.progress.reset()
+            self.progress.setLabelText("Preparing audio generation...")
+            self.progress.setValue(0)  # Show immediately
+
+            # Parse and format the composition in the thread pool,
+            # the audio thread starts once the data is ready
+            self._audio_preparation = AudioDataRunnable(
+                self.MusicExportFormatter, composition_text, musical_style, mood)
+            self._audio_preparation.signals.prepared.connect(
+                self.on_audio_data_prepared)
+            self._audio_preparation.signals.failed.connect(
+                self.on_audio_data_failed)
+            QThreadPool.globalInstance().start(self._audio_preparation)
 
         except ValueError as e:
-            QMessageBox.warning(self, "Input Error", str(e))
+            self._warn("Input Error", str(e))
         except Exception as e:
             logging.error(f"Audio generation error: {str(e)}")
             QMessageBox.critical(
@@ -341,13 +433,149 @@ class ModernInterface(QWidget):
                 "Audio Generation Error",
                 f"Failed to generate audio: {str(e)}")
 
+    def on_audio_data_prepared(self, formatted_data):
+        # Ignore a preparation superseded by a newer click or cancelled
+        if (self.sender() is not self._audio_preparation.signals
+                or self.progress.wasCanceled()):
+            return
+
+        # Create and configure audio generation thread
+        if self.audio_thread is not None:
+            if self.audio_thread.isRunning():
+                self._retire_thread(self.audio_thread)
+            else:
+                self.audio_thread.deleteLater()
+        self.audio_thread = AudioGenerationThread(
+            self.song_generator, formatted_data)
+
+        # Connect signals
+        self.audio_thread.progress_updated.connect(
+            self.update_generation_progress)
+        self.audio_thread.generation_complete.connect(
+            self.handle_generation_complete)
+        self.audio_thread.generation_error.connect(
+            self.handle_generation_error)
+
+        # Connect cancel button
+        self.progress.canceled.connect(self.cancel_audio_generation)
+
+        # Start generation
+        self.audio_thread.start()
+
+    def on_audio_data_failed(self, error_message):
+        if self.sender() is not self._audio_preparation.signals:
+            return
+        logging.error(f"Data formatting error: {error_message}")
+        self.progress.reset()
+        QMessageBox.critical(
+            self, "Formatting Error",
+            f"Failed to process composition data: {error_message}")
+
+    def _load_rag(self, report_failure=False):
+        """Build the (cached) RAG system in the loader pool"""
+        self._rag_loading = True
+        loader = ModelLoader(create_rag)
+        loader.signals.loaded.connect(self.on_rag_loaded)
+        loader.signals.failed.connect(
+            lambda error: self.on_rag_failed(error, report_failure))
+        self._loader_pool.start(loader)
+
+    def on_rag_loaded(self, rag):
+        self._rag_loading = False
+        if self.rag is None:
+            self.rag = rag
+        dropdown = self.text_fields[0]
+        music_styles = [dropdown.itemText(i) for i in range(dropdown.count())]
+        self._loader_pool.start(RagPrefetcher(self.rag, music_styles))
+
+    def on_rag_failed(self, error_message, report_failure=False):
+        # The next composition request retries, and reports a failed retry
+        logging.warning(f"RAG loading failed: {error_message}")
+        self._rag_loading = False
+        if report_failure:
+            QMessageBox.critical(
+                self, "Error", f"Could not load the RAG system: {error_message}")
+
+    def initialize_composer(self):
+        """Create the shared MusicCompositionExperts once the UI is visible"""
+        if self.music_composer is None:
+            self.music_composer = create_music_composer()
+            # Load the model on the LLM server while the form is filled in
+            self._loader_pool.start(LlmWarmer(self.music_composer))
+
+    def _load_obscene_filter(self, report_failure=False):
+        """Build the obscenity classifier in the loader pool"""
+        self._obscene_filter_loading = True
+        loader = ModelLoader(create_obscene_filter)
+        loader.signals.loaded.connect(self.on_obscene_filter_loaded)
+        loader.signals.failed.connect(
+            lambda error: self.on_obscene_filter_failed(error, report_failure))
+        self._loader_pool.start(loader)
+
+    def on_obscene_filter_loaded(self, obscene_filter):
+        self._obscene_filter_loading = False
+        if self.ObsceneFilter is None:
+            self.ObsceneFilter = obscene_filter
+
+    def on_obscene_filter_failed(self, error_message, report_failure=False):
+        # The next composition request retries, and reports a failed retry
+        logging.error(f"Obscene filter loading failed: {error_message}")
+        self._obscene_filter_loading = False
+        if report_failure:
+            QMessageBox.critical(
+                self, "Error", f"Could not load the obscenity filter: {error_message}")
+
+    def _ensure_song_generator(self):
+        """Create the audio generator if the background loading failed"""
+        if self.song_generator is None:
+            loading = QProgressDialog("Loading audio model...", None, 0, 0, self)
+            loading.setWindowTitle("Generating Audio")
+            loading.setWindowModality(Qt.WindowModal)
+            loading.setMinimumDuration(0)
+            loading.show()
+            QApplication.processEvents()
+            try:
+                self.song_generator = create_song_generator()
+            finally:
+                loading.close()
+        return self.song_generator
+
+    def on_song_generator_loaded(self, generator):
+        self._song_generator_loading = False
+        if self.song_generator is None:
+            self.song_generator = generator
+        self.bouton_generer_audio.setEnabled(True)
+
+    def on_song_generator_failed(self, error_message):
+        # Re-enable the button, the next click retries and reports the error
+        logging.error(f"Audio model loading failed: {error_message}")
+        self._song_generator_loading = False
+        self.bouton_generer_audio.setEnabled(True)
+
+    def cancel_audio_generation(self):
+        """Ask the audio thread to stop; its result is discarded"""
+        self.audio_thread.progress_updated.disconnect()
+        self.audio_thread.requestInterruption()
+
+    def _stop_streaming_task(self, task):
+        """Cancel a streaming task; its worker returns to the pool on its own"""
+        task.signals.rag_ready.disconnect()
+        task.cancel()
+
+    def _retire_thread(self, thread):
+        """Keep a reference to a cancelled thread until it has finished"""
+        self._stopping_threads.append(thread)
+
+        def release():
+            self._stopping_threads.remove(thread)
+            thread.deleteLater()
+        thread.finished.connect(release)
+
     def update_generation_progress(self, percent, message):
         """Update progress dialog"""
-        if self.progress is not None:
-            # Debug line
-            print(f"Debug - Updating progress dialog: {percent}% - {message}")
-            self.progress.setLabelText(f"{message}\n{percent}% complete")
-            self.progress.setValue(percent)
+        logging.debug("Progress dialog: %d%% - %s", percent, message)
+        self.progress.setLabelText(f"{message}\n{percent}% complete")
+        self.progress.setValue(percent)
 
     def handle_generation_complete(self, result):
         """Handle successful generation"""
@@ -356,28 +584,13 @@ class ModernInterface(QWidget):
             QMessageBox.information(
                 self, "Generation Complete", "Audio generation completed successfully!")
         else:
-            QMessageBox.warning(self, "Generation Error",
-                                "No audio was generated")
+            self._warn("Generation Error", "No audio was generated")
 
     def handle_generation_error(self, error_message):
         """Handle generation error"""
         QMessageBox.critical(self, "Generation Error",
                              f"Failed to generate audio: {error_message}")
 
-    def _extract_section(self, composition_text, section_name):
-        """Extract a specific section from the composition text"""
-        section_marker = f"## {section_name.upper()}"
-        if section_marker in composition_text:
-            section = composition_text.split(section_marker)[1].split("##")[0]
-            return section.strip()
-        return ""
-
-    def _extract_lyrics(self, composition_text):
-        return self._extract_section(composition_text, "LYRICS")
-
-    def _extract_chords(self, composition_text):
-        return self._extract_section(composition_text, "CHORD PROGRESSION")
-
     def handle_audio_output(self, audio_path: str):
         """Handle the generated audio file"""
         try:
@@ -389,11 +602,10 @@ class ModernInterface(QWidget):
             if self.audio_controls.load_audio(audio_path):
                 self.audio_controls.play_button.click()  # Start playing
             else:
-                QMessageBox.warning(self, "Error", "Failed to load audio file")
+                self._warn("Error", "Failed to load audio file")
 
         except Exception as e:
-            QMessageBox.warning(
-                self, "Error", f"Audio playback failed: {str(e)}")
+            self._warn("Error", f"Audio playback failed: {str(e)}")
             logging.error(f"Audio playback error: {str(e)}")
 
     def setup_audio(self, layout):
@@ -413,14 +625,14 @@ class ModernInterface(QWidget):
         export_label = QLabel("Export Composition:")
         export_layout.addWidget(export_label)
 
+        save_icon = self.style().standardIcon(QStyle.SP_DialogSaveButton)
+
         self.export_json_button = QPushButton('Export to JSON')
-        self.export_json_button.setIcon(
-            self.style().standardIcon(QStyle.SP_DialogSaveButton))
+        self.export_json_button.setIcon(save_icon)
         self.export_json_button.clicked.connect(self.export_to_json)
 
         self.export_txt_button = QPushButton('Export to TXT')
-        self.export_txt_button.setIcon(
-            self.style().standardIcon(QStyle.SP_DialogSaveButton))
+        self.export_txt_button.setIcon(save_icon)
         self.export_txt_button.clicked.connect(self.export_to_txt)
 
         export_layout.addWidget(self.export_json_button)
@@ -429,40 +641,42 @@ class ModernInterface(QWidget):
 
     def export_to_json(self):
         """Handle JSON export"""
-        try:
-            filepath, _ = QFileDialog.getSaveFileName(
-                self, 'Save JSON File', '', 'JSON Files (*.json)'
-            )
-
-            if filepath:
-                composition_text = self.full_composition_field.toPlainText()
-                self.MusicExportFormatter.export_to_json(composition_text, filepath)
-                QMessageBox.information(
-                    self, "Success", "Song exported to JSON successfully!")
+        filepath, _ = QFileDialog.getSaveFileName(
+            self, 'Save JSON File', '', 'JSON Files (*.json)'
+        )
 
-        except Exception as e:
-            QMessageBox.critical(self, "Export Error",
-                                 f"Failed to export to JSON: {str(e)}")
+        if filepath:
+            self._start_export(filepath, 'json')
 
     def export_to_txt(self):
         """Handle TXT export"""
-        try:
-            filepath, _ = QFileDialog.getSaveFileName(
-                self, 'Save Text File', '', 'Text Files (*.txt)'
-            )
+        filepath, _ = QFileDialog.getSaveFileName(
+            self, 'Save Text File', '', 'Text Files (*.txt)'
+        )
 
-            if filepath:
-                composition_text = self.full_composition_field.toPlainText()
-                self.MusicExportFormatter.export_to_txt(composition_text, filepath)
-                QMessageBox.information(
-                    self, "Success", "Song exported to TXT successfully!")
+        if filepath:
+            self._start_export(filepath, 'txt')
 
-        except Exception as e:
-            QMessageBox.critical(self, "Export Error",
-                                 f"Failed to export to TXT: {str(e)}")
+    def _start_export(self, filepath, fmt):
+        """Format and write the composition in the thread pool"""
+        composition_text = self._composition_text()
+        export = ExportRunnable(
+            self.MusicExportFormatter, composition_text, filepath, fmt)
+        export.signals.succeeded.connect(self.on_export_succeeded)
+        export.signals.failed.connect(self.on_export_failed)
+        QThreadPool.globalInstance().start(export)
+
+    def on_export_succeeded(self, fmt):
+        QMessageBox.information(
+            self, "Success", f"Song exported to {fmt.upper()} successfully!")
+
+    def on_export_failed(self, fmt, error_message):
+        QMessageBox.critical(self, "Export Error",
+                             f"Failed to export to {fmt.upper()}: {error_message}")
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     app = QApplication(sys.argv)
     interface = ModernInterface()
     interface.show()
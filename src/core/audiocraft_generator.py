@@ -1,55 +1,194 @@
 from audiocraft.models import MusicGen
 import torch
+import hashlib
 import logging
 import os
+import re
+import shutil
+import soundfile as sf
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Longest clip MusicGen generates in one window, in seconds
+MAX_CLIP_SECONDS = 30
 
-class AudiocraftGenerator:
-    def __init__(self):
-        try:
-            # Check CUDA availability
-            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            logger.info(f"Using device: {self.device}")
+# Generated clips reused for identical prompts, evicted oldest-first past this size
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Loaded (and compiled) models shared by every generator, keyed by (name, device)
+_MODEL_CACHE = {}
+# Duration last applied to each shared model, same keys as _MODEL_CACHE
+_MODEL_DURATIONS = {}
+_LOCK = threading.Lock()
+# A shared model runs one generation at a time: a cancelled generation keeps
+# running until MusicGen returns, and its CUDA graphs cannot be replayed concurrently.
+# Not reentrant and taken by load(): the lazy music_model property must never be
+# first touched while it is held, call load() before taking it
+_GENERATION_LOCK = threading.Lock()
+
+# "Scale: ..." / "Contour: ..." lines of the melody description
+_MELODY_RE = re.compile(r'^[^\n]*?(Scale|Contour):[ \t]*([^\n]*?)[ \t]*$', re.MULTILINE)
+
+
+@lru_cache(maxsize=128)
+def _duration_for(tempo: int, n_sections: int) -> int:
+    """Song duration in seconds for a tempo and a number of sections"""
+    # Assuming each section is typically 8 bars of 4/4
+    total_bars = n_sections * 8
+
+    # Duration = (bars * beats per bar * 60 seconds) / tempo
+    duration = (total_bars * 4 * 60) // tempo
 
-            # Initialize the model
-            self.music_model = MusicGen.get_pretrained('small')
+    # Ensure minimum and maximum duration
+    return max(min(duration, 180), 30)  # Between 30s and 3m
 
-            # Set the model to the appropriate device
-            if hasattr(self.music_model, 'to'):
-                self.music_model = self.music_model.to(self.device)
 
-            # Set default parameters
-            self.set_generation_params(5)
+class AudiocraftGenerator:
+    def __init__(self):
+        # Check CUDA availability
+        self.device = self._setup_device()
+
+        # The model is loaded on first use, see load()
+        self.model_name = 'small'
+        self._music_model = None
+        self.duration = None
+
+        # Generated songs, and the cache of generated audio keyed by prompt/duration/model
+        self.output_dir = os.path.join("output", "generated")
+        self.cache_dir = os.path.join(self.output_dir, ".musicgen_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Cache updates (copy + eviction) run off the generation path
+        self._cache_writer = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def music_model(self) -> MusicGen:
+        """MusicGen model, loaded on first access"""
+        if self._music_model is None:
+            self.load()
+        return self._music_model
+
+    def load(self):
+        """Load the model if needed; slow, call it from a background thread"""
+        if self._music_model is not None:
+            return
+        try:
+            with _LOCK:
+                music_model = _MODEL_CACHE.get((self.model_name, self.device))
+                first_load = music_model is None
+                if first_load:
+                    # Initialize the model
+                    music_model = MusicGen.get_pretrained(self.model_name, device=self.device)
+
+                    # Keep the LM weights in the autocast precision, halving their
+                    # memory traffic, then compile its forward pass (fused kernels, CUDA graphs)
+                    if self.device == 'cuda':
+                        music_model.lm.to(dtype=self.autocast_dtype)
+                        music_model.lm.forward = torch.compile(
+                            music_model.lm.forward, mode="reduce-overhead", fullgraph=False)
+
+                        # Leave some VRAM to the display, release loading leftovers
+                        torch.cuda.set_per_process_memory_fraction(0.9)
+                        torch.cuda.empty_cache()
+                    _MODEL_CACHE[(self.model_name, self.device)] = music_model
+            self._music_model = music_model
+
+            with _GENERATION_LOCK:
+                # Set default parameters
+                self.set_generation_params(5)
+
+                # Pay the compilation cost while loading rather than on the first song
+                if first_load and self.device == 'cuda':
+                    self._generate(["warmup"])
 
         except Exception as e:
+            self._music_model = None
+            self.duration = None
             logger.error(f"Error initializing MusicGen model: {str(e)}")
             raise
 
+    def _setup_device(self) -> str:
+        """Pick the device and the reduced precision used for inference"""
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        logger.info(f"Using device: {device}")
+
+        if device == 'cuda':
+            # TF32 matmuls/convolutions on Ampere+, and cuDNN autotuning
+            # for the codec's fixed shapes
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+            torch.backends.cudnn.benchmark = True
+            torch.set_float32_matmul_precision('high')
+        else:
+            # Leave cores to the Qt event loop
+            torch.set_num_threads(max(1, (os.cpu_count() or 2) // 2))
+            try:
+                torch.set_num_interop_threads(2)
+            except RuntimeError:
+                # Can only be set before any parallel work has started
+                pass
+
+        # FP16 everywhere on CUDA, BF16 where the GPU supports it natively.
+        # Autocast stays off on CPU where BF16 is often slower than FP32.
+        if device == 'cuda' and not torch.cuda.is_bf16_supported():
+            self.autocast_dtype = torch.float16
+        else:
+            self.autocast_dtype = torch.bfloat16
+        return device
+
+    def _generate(self, prompts):
+        """Run MusicGen without autograd and in reduced precision on CUDA"""
+        with torch.inference_mode(), torch.autocast(
+                device_type=self.device, dtype=self.autocast_dtype,
+                enabled=self.device == 'cuda'):
+            return self.music_model.generate(prompts)
+
     def set_generation_params(self, duration: int = 30):
-        """Set generation parameters"""
-        if hasattr(self.music_model, 'set_generation_params'):
+        """Set generation parameters, unless the shared model already uses this duration"""
+        # Called under _GENERATION_LOCK; another generator may have reconfigured the model
+        model_key = (self.model_name, self.device)
+        if _MODEL_DURATIONS.get(model_key) != duration:
             self.music_model.set_generation_params(
                 use_sampling=True,
                 top_k=250,
                 duration=duration  # Duration in seconds
             )
+            _MODEL_DURATIONS[model_key] = duration
+        self.duration = duration
+
+    def generate_music_batched(self, prompts: List[str], duration: int) -> torch.Tensor:
+        """Generate one clip per prompt in a single batched call, as a (B, C, T) tensor"""
+        # Load outside the lock, load() takes it too
+        self.load()
+        with _GENERATION_LOCK:
+            self.set_generation_params(duration=duration)
+            return self._generate(prompts)
 
     def generate_full_song(self, composition_data: Dict[str, Any], progress_callback=None) -> Dict[str, str]:
         try:
-            print(composition_data)
+            # Load before the cache lookup and generation, see _GENERATION_LOCK
+            self.load()
+
+            logger.debug("Composition data: %s", composition_data)
             # Generate timestamp
             timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
+            # Walk the composition data once
+            music_metadata = composition_data["music_metadata"]
+            metadata = composition_data.get("metadata", {})
+            musical_structure = composition_data.get("musical_structure", {})
+            sections = self._get_sections(musical_structure)
+
             # Extract metadata for filename
-            style = composition_data["music_metadata"]["musical_style"]
-            theme = composition_data.get("metadata", {}).get("theme", "no_theme")
-            mood = composition_data["music_metadata"]["mood"]
-            language = composition_data.get("metadata", {}).get("language", "no_lang")
+            style = music_metadata["musical_style"]
+            theme = metadata.get("theme", "no_theme")
+            mood = music_metadata["mood"]
+            language = metadata.get("language", "no_lang")
 
             # Clean metadata values for safe filename
             def clean_filename(text: str) -> str:
@@ -59,24 +198,31 @@ class AudiocraftGenerator:
             # Create filename with all parameters
             filename = f"{timestamp}_{clean_filename(style)}_{clean_filename(theme)}_{clean_filename(mood)}_{clean_filename(language)}.wav"
 
-            # Create output directory
-            output_dir = os.path.join("output", "generated")
-            os.makedirs(output_dir, exist_ok=True)
-
-            instrumental_path = os.path.join(output_dir, filename)
+            instrumental_path = os.path.join(self.output_dir, filename)
 
             # Generate prompt from composition data
             prompt = self._construct_generation_prompt(
-                style=composition_data["music_metadata"]["musical_style"],
-                mood=composition_data["music_metadata"]["mood"],
-                tempo=composition_data["music_metadata"]["tempo_bpm"],
-                key=composition_data["music_metadata"]["primary_key"],
-                composition_data=composition_data
+                style=style,
+                mood=mood,
+                tempo=music_metadata["tempo_bpm"],
+                key=music_metadata["primary_key"],
+                genre_feel=music_metadata.get("genre_specific_feel", "standard"),
+                chord_progression=musical_structure.get(
+                    "chord_progression", {}).get("raw_progression", ""),
+                melody_data=composition_data.get("melody_data", "")
             )
 
-            # Generate and save audio
-            wav = self.music_model.generate([prompt])
-            self.save_audio(wav, instrumental_path)
+            # One prompt per song section, generated together and joined in time
+            prompts = self._construct_section_prompts(prompt, sections)
+            clip_duration = self._clip_duration(
+                musical_structure, music_metadata["tempo_bpm"], len(prompts))
+
+            # Reuse a previous generation of the same prompts, or generate and save audio
+            cached_path = self._cache_path("\n".join(prompts), clip_duration)
+            if not self._copy_from_cache(cached_path, instrumental_path):
+                wavs = self.generate_music_batched(prompts, clip_duration)
+                self.save_audio(wavs, instrumental_path)
+                self._cache_writer.submit(self._store_in_cache, instrumental_path, cached_path)
 
             logger.info(f"Generated audio file: {filename}")
 
@@ -93,104 +239,137 @@ class AudiocraftGenerator:
             logger.error(f"Error generating full song: {str(e)}")
             raise
 
-    def _construct_generation_prompt(self, style: str, mood: str, tempo: int,
-                                     key: str, composition_data: Dict[str, Any]) -> str:
+    def _construct_generation_prompt(self, style: str, mood: str, tempo: int, key: str,
+                                     genre_feel: str, chord_progression: str, melody_data: str) -> str:
         """
         Construct a detailed prompt using all musical information
         """
         # Extract melody information
-        melody_data = composition_data.get('melody_data', '')
-        melody_scale = ''
-        melody_contour = ''
-        if melody_data:
-            # Parse melody information
-            for line in melody_data.split('\n'):
-                if 'Scale:' in line:
-                    melody_scale = line.split('Scale:')[1].strip()
-                elif 'Contour:' in line:
-                    melody_contour = line.split('Contour:')[1].strip()
-
-        # Extract chord progression
-        chord_progression = composition_data.get('musical_structure', {}).get(
-            'chord_progression', {}).get('raw_progression', '')
-
-        # Get genre-specific feel from musical parameters
-        genre_feel = composition_data.get('music_metadata', {}).get('genre_specific_feel', 'standard')
+        melody_info = dict(_MELODY_RE.findall(melody_data)) if melody_data else {}
+        melody_scale = melody_info.get('Scale', '')
+        melody_contour = melody_info.get('Contour', '')
 
         # Construct detailed prompt
-        prompt = (
-            f"Generate {style} music "
-            f"in {key} at {tempo} BPM. "
-        )
+        parts = [f"Generate {style} music in {key} at {tempo} BPM. "]
 
         # Add melody information if available
         if melody_scale and melody_contour:
-            prompt += (
-                f"Use {melody_scale} scale with {melody_contour} melody movement. "
-            )
+            parts.append(f"Use {melody_scale} scale with {melody_contour} melody movement. ")
 
         # Add chord progression if available
         if chord_progression:
-            prompt += f"Follow chord progression: {chord_progression}. "
+            parts.append(f"Follow chord progression: {chord_progression}. ")
 
         # Add mood and feel
-        prompt += (
+        parts.append(
             f"Create a {mood} atmosphere with {genre_feel} feel. "
             f"Make it sound professional and well-produced with clear "
             f"transitions between sections."
         )
 
-        return prompt
+        return "".join(parts)
+
+    def _get_sections(self, musical_structure: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Song sections parsed from the complete song structure"""
+        return musical_structure.get("song_structure", {}).get("sections", [])
 
-    def _calculate_song_duration(self, composition_data: Dict[str, Any]) -> int:
+    def _construct_section_prompts(self, prompt: str, sections: List[Dict[str, Any]]) -> List[str]:
+        """Derive one prompt per song section, or the single prompt if there is only one"""
+        if len(sections) <= 1:
+            return [prompt]
+
+        prompts = []
+        for section in sections:
+            section_prompt = f"{prompt} Section: {section.get('name', 'Verse')}."
+            if section.get('chords'):
+                section_prompt += f" Chords: {' '.join(section['chords'].split())}."
+            prompts.append(section_prompt)
+        return prompts
+
+    def _calculate_song_duration(self, musical_structure: Dict[str, Any], tempo: str) -> int:
         """
         Calculate song duration based on tempo and structure
         Returns duration in seconds
         """
-        try:
-            # Get tempo
-            tempo = composition_data["music_metadata"]["tempo_bpm"]
-
-            # Get structure sections
-            sections = composition_data.get("musical_structure", {}).get(
-                "song_structure", {}
-            ).get("sections", [])
-
-            # Calculate approximate duration based on sections and tempo
-            # Assuming each section is typically 8 bars
-            total_bars = len(sections) * 8
-
-            # Duration = (bars * beats per bar * 60 seconds) / tempo
-            # Assuming 4/4 time signature (4 beats per bar)
-            duration = (total_bars * 4 * 60) / tempo
-
-            # Ensure minimum and maximum duration
-            duration = max(min(duration, 180), 30)  # Between 30s and 3m
-
-            return int(duration)
-
-        except Exception:
-            # Default duration if calculation fails
+        # Default duration without a usable tempo
+        if not str(tempo).isdigit() or int(tempo) == 0:
             return 60
+        return _duration_for(int(tempo), len(self._get_sections(musical_structure)))
+
+    def _clip_duration(self, musical_structure: Dict[str, Any], tempo: str, n_clips: int) -> int:
+        """Duration in seconds of each batched clip: the song duration split across
+        the clips, within MusicGen's window"""
+        song_duration = self._calculate_song_duration(musical_structure, tempo)
+        return max(1, min(song_duration // max(1, n_clips), MAX_CLIP_SECONDS))
+
+    def _cache_path(self, prompt: str, duration: int) -> str:
+        """Path of the cached audio for a prompt generated at a clip duration"""
+        key = hashlib.sha256(
+            f"{prompt}|{duration}|{self.model_name}".encode("utf-8")
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _copy_from_cache(self, cached_path: str, audio_path: str) -> bool:
+        """Copy cached audio to audio_path, False on a miss"""
+        try:
+            shutil.copyfile(cached_path, audio_path)
+            os.utime(cached_path)  # Mark as recently used
+        except OSError:
+            # Missing, or evicted by _store_in_cache meanwhile: generate instead
+            return False
+        logger.info(f"Reusing cached audio: {cached_path}")
+        return True
+
+    def _store_in_cache(self, audio_path: str, cached_path: str):
+        """Copy a generated file into the cache and evict the least recently used files"""
+        try:
+            shutil.copyfile(audio_path, cached_path)
+
+            cached_files = [
+                os.path.join(self.cache_dir, name)
+                for name in os.listdir(self.cache_dir) if name.endswith(".wav")
+            ]
+            cached_files.sort(key=os.path.getmtime)
+            total_size = sum(os.path.getsize(path) for path in cached_files)
+            while total_size > CACHE_MAX_BYTES and cached_files:
+                oldest = cached_files.pop(0)
+                total_size -= os.path.getsize(oldest)
+                os.remove(oldest)
+
+        except OSError as e:
+            # The cache is an optimization, never fail the generation for it
+            logger.warning(f"Could not update audio cache: {str(e)}")
 
     def save_audio(self, wav: torch.Tensor, output_path: str):
-        """Save the generated audio to a file"""
+        """Save the generated audio to a file, writing the sections one after the other"""
         try:
-            # Ensure output directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-            # MusicGen returns a 3D tensor [batch, channels, time]
-            # We need to squeeze the batch dimension if it's 1
-            if wav.dim() == 3:
-                wav = wav.squeeze(0)  # Remove batch dimension
-
-            # Save the audio file
-            if hasattr(self.music_model, 'save_wav'):
-                self.music_model.save_wav(wav, output_path)
-            else:
-                # Fallback to torchaudio if needed
-                import torchaudio
-                torchaudio.save(output_path, wav.cpu(), 32000)
+            # MusicGen returns a 3D tensor [batch, channels, time],
+            # with one batch entry per song section
+            if wav.dim() == 2:
+                wav = wav.unsqueeze(0)
+
+            # Queue every section's copy to pinned host memory up front,
+            # so writing a section overlaps with copying the next ones
+            sections = []
+            for section in wav.detach():
+                if section.is_cuda:
+                    pinned = torch.empty(section.shape, dtype=section.dtype, pin_memory=True)
+                    pinned.copy_(section, non_blocking=True)
+                    copied = torch.cuda.Event()
+                    copied.record()
+                    sections.append((pinned, copied))
+                else:
+                    sections.append((section, None))
+
+            # Stream each section to the file instead of joining them in memory
+            with sf.SoundFile(output_path, 'w', samplerate=self.music_model.sample_rate,
+                              channels=wav.shape[1], subtype='PCM_16') as writer:
+                for section, copied in sections:
+                    if copied is not None:
+                        copied.synchronize()
+                    # Write in FP32 regardless of the inference precision, clamped
+                    # since 16-bit PCM wraps samples outside [-1, 1] into clicks
+                    writer.write(section.float().clamp(-1, 1).numpy().T)
 
         except Exception as e:
             logger.error(f"Error saving audio: {str(e)}")
@@ -201,8 +380,12 @@ class AudiocraftGenerator:
         Estimate generation time based on audio parameters
         Returns estimated time in seconds
         """
-        # Get base generation parameters
-        duration = self.music_model.generation_params.get('duration', 5)
+        musical_structure = composition_data.get("musical_structure", {})
+        n_clips = max(1, len(self._get_sections(musical_structure)))
+        tempo = composition_data.get("music_metadata", {}).get("tempo_bpm", "")
+        # The sections are generated together in one batched call, so the time
+        # follows the length of one clip rather than the length of the song
+        duration = self._clip_duration(musical_structure, tempo, n_clips)
 
         # Factor in model size
         # 'small' model is faster than 'medium' or 'large'
@@ -1,27 +1,87 @@
 # src/core/music_composition_experts.py
 import os
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import StrOutputParser
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from textwrap import dedent
+from openai import OpenAI
 from dotenv import load_dotenv
 
+# Default model of langchain's ChatOpenAI, the local server answers with the model it has loaded
+MODEL_NAME = "gpt-3.5-turbo"
+# Asks a llama.cpp server to reuse the KV cache of the common prompt prefix,
+# only sent when MODEL_CACHE_PROMPT is set: strict endpoints reject unknown fields
+CACHE_PROMPT = {"cache_prompt": True}
+# Number of complete compositions kept in memory
+COMPOSITION_CACHE_SIZE = 32
+# Compositions are only cached at or below this temperature, above it a new
+# request with the same inputs is expected to give a different song
+CACHE_MAX_TEMPERATURE = 0.05
+
 
 class MusicCompositionExperts:
+    __slots__ = ('client', 'temperature', '_extra_body', '_compositions', '_compositions_lock')
+
     load_dotenv()
 
     def __init__(self):
-        self.llm = ChatOpenAI(
-            # pour test
-            temperature=0.01,
-            # pour projet
-            # temperature=0.3,
+        # Single client, its HTTP connection pool is reused by every generation
+        self.client = OpenAI(
             base_url=os.getenv('MODEL_URL'),
-            api_key="not-needed",
-            streaming=True
+            api_key="not-needed"
+        )
+        self._extra_body = (
+            CACHE_PROMPT if os.getenv('MODEL_CACHE_PROMPT', '').lower() in ('1', 'true', 'yes')
+            else None)
+        # pour test
+        self.temperature = 0.01
+        # pour projet
+        # self.temperature = 0.3
+        # (style, structure, theme, mood, language) -> chunks of the composition
+        self._compositions = OrderedDict()
+        # Streams of a cancelled request may still be finishing in another thread
+        self._compositions_lock = threading.Lock()
+
+    def warm_up(self):
+        """Send a one-token request so the server loads the model before the first composition."""
+        self.client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1
         )
 
-    MUSICAL_PARAMETERS_TEMPLATE = """
-    You are a music producer creating a {musical_style} song with a {mood} mood.
+    def _complete(self, template, variables):
+        """Fill the template and return the whole, non-streamed answer."""
+        response = self.client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": template.format_map(variables)}],
+            temperature=self.temperature,
+            extra_body=self._extra_body
+        )
+        return response.choices[0].message.content or ""
+
+    def _stream(self, template, variables):
+        """Fill the template with str.format_map and yield the streamed text deltas."""
+        messages = [{"role": "user", "content": template.format_map(variables)}]
+        with self.client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=messages,
+            temperature=self.temperature,
+            stream=True,
+            extra_body=self._extra_body
+        ) as stream:
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    yield delta
+
+    # Indentation stripped once when the class is defined, not on every request.
+    # Static instructions come first and the variables last, so the server can
+    # reuse the cached prefix of each template from one request to the next
+    MUSICAL_PARAMETERS_TEMPLATE = dedent("""
+    You are a music producer creating a song in the musical style and mood given at the end.
 
     First, generate a creative title that reflects the style, mood, and theme provided.
     The title should be catchy and memorable.
@@ -43,12 +103,12 @@ class MusicCompositionExperts:
     - <instrument 1>
     - <instrument 2>
     - <instrument 3>
-    (List 3-4 key instruments typical for {musical_style})
+    (List 3-4 key instruments typical for the musical style)
 
     Effects:
     - <effect 1>
     - <effect 2>
-    (List 2-3 key effects appropriate for {musical_style})
+    (List 2-3 key effects appropriate for the musical style)
 
     [Mix Notes]
     Mix Focus: <specific mix focus, e.g., "Bass-heavy", "Vocal-forward", "Balanced">
@@ -56,103 +116,99 @@ class MusicCompositionExperts:
     EQ Focus: <specific frequency focus, e.g., "Rich low-end", "Bright highs", "Mid-focused">
 
     Provide ONLY these parameters exactly as requested, with no additional explanations or variations.
-    """
 
-    LYRICS_EXPERT_TEMPLATE = """
-        You are a professional lyricist. Create structured lyrics based on:
-        Musical Style: {musical_style}
-        Structure: {structure}
-        Song Theme: {song_theme}
-        Mood: {mood}
-        Language: {language}
-        Musical Parameters: {musical_params}
+    Musical Style: {musical_style}
+    Mood: {mood}
+    """)
+
+    LYRICS_EXPERT_TEMPLATE = dedent("""
+        You are a professional lyricist. Create structured lyrics based on the song details given at the end.
 
-        Create a song with EXACTLY this structure:
-        {structure}
+        Create a song with EXACTLY the structure given in the song details.
 
         Format with section labels and exact line counts in brackets:
 
         Show ONLY the lyrics for each section. Do not include any other content.
-        """
 
-    CHORD_PROGRESSION_TEMPLATE = """
-        You are a professional music composer. Create chord progressions matching:
-        Musical Parameters: {musical_params}
-        Key: {key}
-        Style: {musical_style}
+        Musical Style: {musical_style}
+        Song Theme: {song_theme}
         Mood: {mood}
+        Language: {language}
+        Musical Parameters: {musical_params}
+        Structure: {structure}
+        """)
+
+    CHORD_PROGRESSION_TEMPLATE = dedent("""
+        You are a professional music composer. Create chord progressions matching the song details given at the end.
 
-        Provide chord progressions in this format:
+        Provide chord progressions in this format, using the time signature of the song details:
 
-        [Verse] [{time_signature}]
+        [Verse] [<time signature>]
         Chord sequence: (4-8 chords, using the specified key)
         Duration: (in bars)
         Rhythm: (straight, syncopated, etc.)
 
-        [Chorus] [{time_signature}]
+        [Chorus] [<time signature>]
         Chord sequence: (4-8 chords)
         Duration: (in bars)
         Rhythm: (pattern description)
 
-        [Bridge] [{time_signature}]
+        [Bridge] [<time signature>]
         Chord sequence: (4 chords max)
         Duration: (in bars)
         Rhythm: (pattern description)
 
-        Use proper chord notation for {key}. Include any specific rhythmic accents.
-        """
+        Use proper chord notation for the specified key. Include any specific rhythmic accents.
 
-    MELODY_COMPOSITION_TEMPLATE = """
-        You are a melody composer. Create a melody matching:
+        Style: {musical_style}
+        Mood: {mood}
         Musical Parameters: {musical_params}
         Key: {key}
-        Tempo: {tempo}
-        Style: {musical_style}
+        Time Signature: {time_signature}
+        """)
+
+    MELODY_COMPOSITION_TEMPLATE = dedent("""
+        You are a melody composer. Create a melody matching the song details given at the end.
 
         Provide melody details for each section:
 
         [Verse Melody]
-        Scale: (based on {key})
+        Scale: (based on the key)
         Contour: (melodic movement)
-        Rhythm: (based on {tempo} BPM)
+        Rhythm: (based on the tempo in BPM)
         Range: (specific note range)
         Syncopation: (yes/no, description)
 
         [Chorus Melody]
-        Scale: (based on {key})
+        Scale: (based on the key)
         Contour: (melodic movement)
-        Rhythm: (based on {tempo} BPM)
+        Rhythm: (based on the tempo in BPM)
         Range: (specific note range)
         Peak Notes: (climax points)
 
         [Bridge Melody]
-        Scale: (based on {key})
+        Scale: (based on the key)
         Contour: (melodic movement)
-        Rhythm: (based on {tempo} BPM)
+        Rhythm: (based on the tempo in BPM)
         Range: (specific note range)
-        """
+
+        Style: {musical_style}
+        Musical Parameters: {musical_params}
+        Key: {key}
+        Tempo: {tempo}
+        """)
 
     def generate_lyrics(self, musical_style, structure, song_theme, mood, language):
         """Generate only the lyrics section of the song."""
         # First get musical parameters
-        params_prompt = ChatPromptTemplate.from_template(
-            self.MUSICAL_PARAMETERS_TEMPLATE)
-        params_chain = params_prompt | self.llm | StrOutputParser()
-
-        musical_params = ""
-        for chunk in params_chain.stream({
+        musical_params = self._complete(self.MUSICAL_PARAMETERS_TEMPLATE, {
             "musical_style": musical_style,
             "mood": mood
-        }):
-            musical_params += chunk
+        })
 
         # Then generate lyrics with the parameters
-        lyrics_prompt = ChatPromptTemplate.from_template(
-            self.LYRICS_EXPERT_TEMPLATE)
-        lyrics_chain = lyrics_prompt | self.llm | StrOutputParser()
-
         yield "## LYRICS\n\n"
-        for chunk in lyrics_chain.stream({
+        for chunk in self._stream(self.LYRICS_EXPERT_TEMPLATE, {
             "musical_style": musical_style,
             "structure": structure,
             "song_theme": song_theme,
@@ -165,32 +221,16 @@ class MusicCompositionExperts:
     def generate_chord_progression(self, musical_style, song_theme, mood, language):
         """Generate only the chord progression section."""
         # First get musical parameters
-        params_prompt = ChatPromptTemplate.from_template(
-            self.MUSICAL_PARAMETERS_TEMPLATE)
-        params_chain = params_prompt | self.llm | StrOutputParser()
-
-        musical_params = ""
-        for chunk in params_chain.stream({
+        musical_params = self._complete(self.MUSICAL_PARAMETERS_TEMPLATE, {
             "musical_style": musical_style,
             "mood": mood
-        }):
-            musical_params += chunk
+        })
 
         # Extract key and time signature
-        key = "C major"  # Default
-        time_signature = "4/4"  # Default
-        for line in musical_params.split('\n'):
-            if "Key:" in line:
-                key = line.split("Key:")[1].strip()
-            elif "Time Signature:" in line:
-                time_signature = line.split("Time Signature:")[1].strip()
-
-        chord_prompt = ChatPromptTemplate.from_template(
-            self.CHORD_PROGRESSION_TEMPLATE)
-        chord_chain = chord_prompt | self.llm | StrOutputParser()
+        key, _tempo, time_signature = self._extract_key_parameters(musical_params)
 
         yield "## CHORD PROGRESSION\n\n"
-        for chunk in chord_chain.stream({
+        for chunk in self._stream(self.CHORD_PROGRESSION_TEMPLATE, {
             "musical_style": musical_style,
             "mood": mood,
             "musical_params": musical_params,
@@ -202,32 +242,16 @@ class MusicCompositionExperts:
     def generate_melody(self, musical_style, song_theme, mood, language):
         """Generate only the melody section."""
         # First get musical parameters
-        params_prompt = ChatPromptTemplate.from_template(
-            self.MUSICAL_PARAMETERS_TEMPLATE)
-        params_chain = params_prompt | self.llm | StrOutputParser()
-
-        musical_params = ""
-        for chunk in params_chain.stream({
+        musical_params = self._complete(self.MUSICAL_PARAMETERS_TEMPLATE, {
             "musical_style": musical_style,
             "mood": mood
-        }):
-            musical_params += chunk
+        })
 
         # Extract key and tempo
-        key = "C major"  # Default
-        tempo = "120 BPM"  # Default
-        for line in musical_params.split('\n'):
-            if "Key:" in line:
-                key = line.split("Key:")[1].strip()
-            elif "Tempo:" in line:
-                tempo = line.split("Tempo:")[1].strip()
-
-        melody_prompt = ChatPromptTemplate.from_template(
-            self.MELODY_COMPOSITION_TEMPLATE)
-        melody_chain = melody_prompt | self.llm | StrOutputParser()
+        key, tempo, _time_signature = self._extract_key_parameters(musical_params)
 
         yield "## MELODY\n\n"
-        for chunk in melody_chain.stream({
+        for chunk in self._stream(self.MELODY_COMPOSITION_TEMPLATE, {
             "musical_style": musical_style,
             "mood": mood,
             "musical_params": musical_params,
@@ -252,23 +276,34 @@ class MusicCompositionExperts:
                 yield chunk
 
     def generate_song_composition(self, musical_style, structure, song_theme, mood, language):
-        """Generate a complete song composition with musical parameters."""
-        # Create prompt templates
-        params_prompt = ChatPromptTemplate.from_template(
-            self.MUSICAL_PARAMETERS_TEMPLATE)
-        lyrics_prompt = ChatPromptTemplate.from_template(
-            self.LYRICS_EXPERT_TEMPLATE)
-        chord_prompt = ChatPromptTemplate.from_template(
-            self.CHORD_PROGRESSION_TEMPLATE)
-        melody_prompt = ChatPromptTemplate.from_template(
-            self.MELODY_COMPOSITION_TEMPLATE)
-
-        # Create chains
-        params_chain = params_prompt | self.llm | StrOutputParser()
-        lyrics_chain = lyrics_prompt | self.llm | StrOutputParser()
-        chord_chain = chord_prompt | self.llm | StrOutputParser()
-        melody_chain = melody_prompt | self.llm | StrOutputParser()
+        """Generate a complete song composition, replayed from memory for identical inputs at low temperature."""
+        if self.temperature > CACHE_MAX_TEMPERATURE:
+            yield from self._compose(musical_style, structure, song_theme, mood, language)
+            return
+
+        key = (musical_style, structure, song_theme, mood, language)
+        with self._compositions_lock:
+            chunks = self._compositions.get(key)
+            if chunks is not None:
+                self._compositions.move_to_end(key)
+        if chunks is not None:
+            # Same chunks as the original stream, so generate_song_structure still finds its marker
+            yield from chunks
+            return
+
+        chunks = []
+        for chunk in self._compose(musical_style, structure, song_theme, mood, language):
+            chunks.append(chunk)
+            yield chunk
+
+        # Only reached when the stream was consumed to the end
+        with self._compositions_lock:
+            self._compositions[key] = tuple(chunks)
+            if len(self._compositions) > COMPOSITION_CACHE_SIZE:
+                self._compositions.popitem(last=False)
 
+    def _compose(self, musical_style, structure, song_theme, mood, language):
+        """Generate a complete song composition with musical parameters."""
         # Generate header
         yield f"""# Song Composition
             Musical Style: {musical_style}
@@ -280,7 +315,7 @@ class MusicCompositionExperts:
         # 1. Generate Musical Parameters
         yield "## 1. MUSICAL PARAMETERS\n\n"
         musical_params = ""
-        for chunk in params_chain.stream({
+        for chunk in self._stream(self.MUSICAL_PARAMETERS_TEMPLATE, {
             "musical_style": musical_style,
             "structure": structure,
             "mood": mood
@@ -290,61 +325,59 @@ class MusicCompositionExperts:
         yield "\n\n"
 
         # Extract key parameters for use in other sections
-        key = "C major"  # Default values
-        tempo = "120 BPM"
-        time_signature = "4/4"
-
-        # Parse the musical_params to extract actual values
-        for line in musical_params.split('\n'):
-            if "Key:" in line:
-                key = line.split("Key:")[1].strip()
-            elif "Tempo:" in line:
-                tempo = line.split("Tempo:")[1].strip()
-            elif "Time Signature:" in line:
-                time_signature = line.split("Time Signature:")[1].strip()
-
-        # 2. Generate Lyrics with musical parameters
-        yield "## 2. LYRICS\n\n"
-        lyrics_text = ""
-        for chunk in lyrics_chain.stream({
-            "musical_style": musical_style,
-            "structure": structure,
-            "song_theme": song_theme,
-            "mood": mood,
-            "language": language,
-            "musical_params": musical_params
-        }):
-            lyrics_text += chunk
-            yield chunk
-        yield "\n\n"
-
-        # 3. Generate Chords with musical parameters
-        yield "## 3. CHORD PROGRESSION\n\n"
-        chord_text = ""
-        for chunk in chord_chain.stream({
+        key, tempo, time_signature = self._extract_key_parameters(musical_params)
+
+        # Chords and melody only depend on the musical parameters,
+        # request them now so they are ready once the lyrics are streamed. Each
+        # composition gets its own workers, so it never queues behind the
+        # requests of an abandoned one
+        executor = ThreadPoolExecutor(max_workers=2)
+        chord_future = executor.submit(self._complete, self.CHORD_PROGRESSION_TEMPLATE, {
             "musical_style": musical_style,
             "mood": mood,
             "musical_params": musical_params,
             "key": key,
             "time_signature": time_signature
-        }):
-            chord_text += chunk
-            yield chunk
-        yield "\n\n"
-
-        # 4. Generate Melody with musical parameters
-        yield "## 4. MELODY\n\n"
-        melody_text = ""
-        for chunk in melody_chain.stream({
+        })
+        melody_future = executor.submit(self._complete, self.MELODY_COMPOSITION_TEMPLATE, {
             "musical_style": musical_style,
             "mood": mood,
             "musical_params": musical_params,
             "key": key,
             "tempo": tempo
-        }):
-            melody_text += chunk
-            yield chunk
-        yield "\n\n"
+        })
+
+        try:
+            # 2. Generate Lyrics with musical parameters
+            yield "## 2. LYRICS\n\n"
+            lyrics_text = ""
+            for chunk in self._stream(self.LYRICS_EXPERT_TEMPLATE, {
+                "musical_style": musical_style,
+                "structure": structure,
+                "song_theme": song_theme,
+                "mood": mood,
+                "language": language,
+                "musical_params": musical_params
+            }):
+                lyrics_text += chunk
+                yield chunk
+            yield "\n\n"
+
+            # 3. Chords generated with the musical parameters
+            yield "## 3. CHORD PROGRESSION\n\n"
+            chord_text = chord_future.result()
+            yield chord_text
+            yield "\n\n"
+
+            # 4. Melody generated with the musical parameters
+            yield "## 4. MELODY\n\n"
+            melody_text = melody_future.result()
+            yield melody_text
+            yield "\n\n"
+        finally:
+            # Don't wait for the requests of an abandoned stream, their
+            # workers exit once the server has answered
+            executor.shutdown(wait=False)
 
         # 5. Generate Combined View
         yield "## 5. COMPLETE SONG STRUCTURE\n\n"
@@ -390,6 +423,20 @@ class MusicCompositionExperts:
 
             yield "\n"
 
+    def _extract_key_parameters(self, musical_params: str) -> tuple:
+        """Extract (key, tempo, time signature) from the musical parameters, with defaults."""
+        key = "C major"
+        tempo = "120 BPM"
+        time_signature = "4/4"
+        for line in musical_params.split('\n'):
+            if "Key:" in line:
+                key = line.split("Key:")[1].strip()
+            elif "Tempo:" in line:
+                tempo = line.split("Tempo:")[1].strip()
+            elif "Time Signature:" in line:
+                time_signature = line.split("Time Signature:")[1].strip()
+        return key, tempo, time_signature
+
     def _extract_section(self, text: str, section_name: str) -> str:
         """
         Extract a specific section from the text, handling various section formats.
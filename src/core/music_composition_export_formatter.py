@@ -1,11 +1,52 @@
 # src/core/music_composition_export_formatter.py
 import json
 import logging
+import re
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Sections produced by MusicCompositionExperts.generate_song_composition
+_KNOWN_SECTIONS = (
+    "MUSICAL PARAMETERS",
+    "LYRICS",
+    "CHORD PROGRESSION",
+    "MELODY",
+    "COMPLETE SONG STRUCTURE",
+)
+# "## 2. LYRICS" style headers, the numbering is dropped from the name
+_SECTION_RE = re.compile(r'^[ \t]*##[ \t#]*(?:\d+\.[ \t]*)?([^\n]*?)[ \t#]*$', re.MULTILINE)
+# "**Musical Parameters**" block, up to the next "**" line
+_MUSICAL_PARAMS_RE = re.compile(
+    r'^[ \t]*\*\*Musical Parameters\*\*[^\n]*\n(.*?)(?=^[ \t]*\*\*|\Z)',
+    re.MULTILINE | re.DOTALL)
+# "Key: value" lines
+_PARAM_LINE_RE = re.compile(r'^[ \t]*([^:\n]+):[ \t]*(\S[^\n]*?)[ \t]*$', re.MULTILINE)
+# Lines holding one of the metadata fields, the value is what follows the first ":"
+_METADATA_FIELDS = ("Musical Style", "Theme", "Mood", "Language")
+_METADATA_LINE_RE = re.compile(
+    r'^[^\n]*?(?:' + '|'.join(map(re.escape, _METADATA_FIELDS)) + r'):[^\n]*$', re.MULTILINE)
+
+
+@lru_cache(maxsize=8)
+def _split_sections(text: str) -> Dict[str, str]:
+    """Known sections of a composition, memoized since the same text is parsed for audio and exports"""
+    sections = dict.fromkeys(_KNOWN_SECTIONS, "")
+    matches = list(_SECTION_RE.finditer(text))
+
+    for i, match in enumerate(matches):
+        name = match.group(1)
+        if name not in sections:
+            continue
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        content = text[match.end():end].strip()
+        if content:
+            sections[name] = content
+
+    return sections
+
 
 class MusicCompositionExportFormatter:
     """
@@ -27,17 +68,8 @@ class MusicCompositionExportFormatter:
     def parse_composition(self, composition_text: str) -> Dict[str, Any]:
         """Parse the full composition text into a structured format."""
         try:
-            # Split into sections
-            raw_sections = self._parse_composition_sections(composition_text)
-
-            # Create a mapping of normalized section names
-            sections = {
-                "MUSICAL PARAMETERS": raw_sections.get("1. MUSICAL PARAMETERS", ""),
-                "LYRICS": raw_sections.get("2. LYRICS", ""),
-                "CHORD PROGRESSION": raw_sections.get("3. CHORD PROGRESSION", ""),
-                "MELODY": raw_sections.get("4. MELODY", ""),
-                "COMPLETE SONG STRUCTURE": raw_sections.get("5. COMPLETE SONG STRUCTURE", "")
-            }
+            # Split into the known sections
+            sections = self._parse_composition_sections(composition_text)
 
             # Extract and validate metadata
             metadata = self._extract_metadata(composition_text, sections)
@@ -94,33 +126,13 @@ class MusicCompositionExportFormatter:
             raise
 
     def _parse_composition_sections(self, text: str) -> Dict[str, str]:
-        """Parse composition text into main sections with improved debugging."""
-        sections = {}
-        current_section = None
-        current_content = []
-
-        print("Starting section parsing...")
-        for line in text.split('\n'):
-            if line.strip().startswith('##'):
-                if current_section and current_content:
-                    content = '\n'.join(current_content).strip()
-                    if content:
-                        sections[current_section] = content
-                        print(f"Added section {current_section} with length {len(content)}")
-                    current_content = []
-                current_section = line.replace('#', '').strip()
-                print(f"Found new section: {current_section}")
-            elif current_section:
-                current_content.append(line)
-
-        # Handle last section
-        if current_section and current_content:
-            content = '\n'.join(current_content).strip()
-            if content:
-                sections[current_section] = content
-                print(f"Added final section {current_section} with length {len(content)}")
-
-        print("Final sections found:", list(sections.keys()))
+        """
+        Parse composition text into the known sections in a single pass.
+        Every known section is present, empty if it wasn't found.
+        """
+        # Copy, the cached dict is shared between calls
+        sections = dict(_split_sections(text))
+        logger.debug(f"Sections found: {list(sections.keys())}")
         return sections
 
     def _parse_song_structure(self, structure_text: str) -> Dict[str, Any]:
@@ -172,12 +184,13 @@ class MusicCompositionExportFormatter:
 
     def _extract_metadata(self, composition_text: str, sections: Dict[str, str]) -> Dict[str, str]:
         """Extract and validate all metadata fields."""
+        fields = self._extract_metadata_fields(composition_text)
         metadata = {
-            "title": self._extract_title(sections.get("MUSICAL PARAMETERS", "")),
-            "style": self._extract_metadata_field(composition_text, "Musical Style"),
-            "theme": self._extract_metadata_field(composition_text, "Theme"),
-            "mood": self._extract_metadata_field(composition_text, "Mood"),
-            "language": self._extract_metadata_field(composition_text, "Language"),
+            "title": self._extract_title(sections["MUSICAL PARAMETERS"]),
+            "style": fields.get("Musical Style", ""),
+            "theme": fields.get("Theme", ""),
+            "mood": fields.get("Mood", ""),
+            "language": fields.get("Language", ""),
             "generated_at": datetime.now().isoformat()
         }
 
@@ -194,44 +207,38 @@ class MusicCompositionExportFormatter:
                         return next_line.strip().strip('"')
         return ""
 
-    def _extract_metadata_field(self, text: str, field: str) -> str:
-        """Extract specific metadata field from text."""
-        for line in text.split('\n'):
-            if f"{field}:" in line:
-                value = line.split(':', 1)[1].strip()
-                if value:  # Only return non-empty values
-                    return value
-        return ""
+    def _extract_metadata_fields(self, text: str) -> Dict[str, str]:
+        """Extract the first non-empty value of every metadata field in one pass."""
+        fields = {}
+        for match in _METADATA_LINE_RE.finditer(text):
+            line = match.group(0)
+            value = line.split(':', 1)[1].strip()
+            if not value:  # Only keep non-empty values
+                continue
+            for field in _METADATA_FIELDS:
+                if field not in fields and f"{field}:" in line:
+                    fields[field] = value
+            if len(fields) == len(_METADATA_FIELDS):
+                break
+        return fields
 
     def _extract_musical_parameters(self, text: str) -> Dict[str, str]:
         """Extract musical parameters with improved parsing."""
         params = {}
-        in_musical_params = False
-
-        for line in text.split('\n'):
-            line = line.strip()
 
-            if line.startswith('**Musical Parameters**'):
-                in_musical_params = True
-                continue
-            elif line.startswith('**') and in_musical_params:
-                in_musical_params = False
-                continue
+        for block in _MUSICAL_PARAMS_RE.finditer(text):
+            for match in _PARAM_LINE_RE.finditer(block.group(1)):
+                key = match.group(1).strip().lower()
+                value = match.group(2)
 
-            if in_musical_params and ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip().lower()
-                value = value.strip()
-
-                if value:
-                    if 'tempo' in key:
-                        params['tempo'] = value.split()[0]  # Extract just the number
-                    elif 'key' in key:
-                        params['key'] = value
-                    elif 'time signature' in key:
-                        params['time_signature'] = value
-                    elif 'genre-specific feel' in key:
-                        params['genre_specific_feel'] = value
+                if 'tempo' in key:
+                    params['tempo'] = value.split()[0]  # Extract just the number
+                elif 'key' in key:
+                    params['key'] = value
+                elif 'time signature' in key:
+                    params['time_signature'] = value
+                elif 'genre-specific feel' in key:
+                    params['genre_specific_feel'] = value
 
         return params
 
@@ -367,7 +374,6 @@ class MusicCompositionExportFormatter:
         """Export composition to JSON file."""
         try:
             formatted_data = self.parse_composition(composition_text)
-            print("export_to_json", formatted_data)
             if not formatted_data:
                 raise ValueError("No valid data to export")
 
@@ -461,15 +467,16 @@ class MusicCompositionExportFormatter:
 
             # Process chord progression
             if chord_progression:
-                chord_text = ""
+                chord_lines = []
                 for section, data in chord_progression.items():
-                    chord_text += f"[{section}]\n"
+                    chord_lines.append(f"[{section}]\n")
                     if 'progression' in data:
-                        chord_text += f"Chord sequence: {', '.join(data['progression'])}\n"
+                        chord_lines.append(f"Chord sequence: {', '.join(data['progression'])}\n")
                     if 'time_signature' in data:
-                        chord_text += f"Time signature: {data['time_signature']}\n"
+                        chord_lines.append(f"Time signature: {data['time_signature']}\n")
                     if 'rhythm' in data:
-                        chord_text += f"Rhythm: {', '.join(data['rhythm'])}\n"
+                        chord_lines.append(f"Rhythm: {', '.join(data['rhythm'])}\n")
+                chord_text = "".join(chord_lines)
 
                 if "musical_structure" not in metadata:
                     metadata["musical_structure"] = {}
@@ -477,14 +484,13 @@ class MusicCompositionExportFormatter:
 
             # Process lyrics
             if lyrics:
-                lyrics_text = ""
-                for section, content in lyrics.items():
-                    lyrics_text += f"[{section}]\n{content}\n\n"
+                lyrics_text = "".join(
+                    f"[{section}]\n{content}\n\n" for section, content in lyrics.items())
 
                 metadata["lyrics_data"] = lyrics_text.strip()
 
             # Log the final metadata for debugging
-            logging.debug(f"Generated audio metadata: {metadata}")
+            logger.debug("Generated audio metadata: %s", metadata)
 
             return metadata
 
@@ -1,13 +1,45 @@
+from collections import OrderedDict
+
 from transformers import pipeline
 
 class ObsceneFilter:
+    threshold = 0.75
+    # Most recently used verdicts kept, older ones are evicted
+    max_verdicts = 1024
+
     def __init__(self):
         self.model = pipeline("text-classification", model="unitary/toxic-bert")
+        # Verdicts of already classified texts, inputs are re-checked on every click
+        self._verdicts = OrderedDict()
+
+    def _remember(self, text, verdict: bool):
+        self._verdicts[text] = verdict
+        self._verdicts.move_to_end(text)
+        if len(self._verdicts) > self.max_verdicts:
+            self._verdicts.popitem(last=False)
 
     def is_obscene(self, text) -> bool:
+        if text in self._verdicts:
+            self._verdicts.move_to_end(text)
+            return self._verdicts[text]
         result = self.model(text)
-        threshold = 0.75
-        if result[0]['score'] < threshold:
-            return False
-        else:
-            return True
\ No newline at end of file
+        verdict = result[0]['score'] >= self.threshold
+        self._remember(text, verdict)
+        return verdict
+
+    def are_any_obscene(self, items) -> bool:
+        """Classify all unseen items in a single batched pipeline call"""
+        verdicts = {}
+        unseen = []
+        for item in dict.fromkeys(items):
+            if item in self._verdicts:
+                self._verdicts.move_to_end(item)
+                verdicts[item] = self._verdicts[item]
+            else:
+                unseen.append(item)
+        if unseen:
+            results = self.model(unseen)
+            for item, result in zip(unseen, results):
+                verdicts[item] = result['score'] >= self.threshold
+                self._remember(item, verdicts[item])
+        return any(verdicts.values())
@@ -1,13 +1,17 @@
 import os
+import threading
+from collections import OrderedDict
+import numpy as np
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 CHROMA_PATH = os.path.join(current_dir, "../../chroma/")
 DATA_PATH = os.path.join(current_dir, "../../ragData/")
+DEFAULT_STRUCTURE = "Intro → Verse 1 → Chorus → Verse 2 → Chorus → Bridge → Chorus → Outro"
 
 
 class MusicStructureRAG:
@@ -36,8 +40,10 @@ class MusicStructureRAG:
             temperature=0.3,
             base_url=os.getenv('MODEL_URL'),
             api_key="not-needed",
-            streaming=True
+            # The structure is read whole with invoke(), no need for token streaming
+            streaming=False
         )
+        self.prompt_template = ChatPromptTemplate.from_template(self.PROMPT_TEMPLATE)
 
     def _retrieve_context(self, query: str) -> List[Tuple[str, float]]:
         """Retrieve relevant context"""
@@ -68,7 +74,7 @@ class MusicStructureRAG:
 
             if not results:
                 # If no results found, use rock structure as fallback
-                fallback_structure = "Intro → Verse 1 → Chorus → Verse 2 → Chorus → Bridge → Chorus → Outro"
+                fallback_structure = DEFAULT_STRUCTURE
                 print(f"No structure found for {music_style}, using default rock structure")
                 return fallback_structure
 
@@ -78,8 +84,7 @@ class MusicStructureRAG:
             print("Generating structured list...")
 
             # Create and execute prompt
-            prompt_template = ChatPromptTemplate.from_template(self.PROMPT_TEMPLATE)
-            prompt = prompt_template.format(
+            prompt = self.prompt_template.format(
                 context=context_text,
                 music_style=music_style
             )
@@ -90,14 +95,14 @@ class MusicStructureRAG:
 
             if not cleaned_response or "→" not in cleaned_response:
                 # Return default structure if response is invalid
-                return "Intro → Verse 1 → Chorus → Verse 2 → Chorus → Bridge → Chorus → Outro"
+                return DEFAULT_STRUCTURE
             
             return cleaned_response
 
         except Exception as e:
             print(f"Error in RAG query: {str(e)}")
             # Return a safe fallback structure
-            return "Intro → Verse 1 → Chorus → Verse 2 → Chorus → Bridge → Chorus → Outro"
+            return DEFAULT_STRUCTURE
 
     def _clean_response(self, response: str) -> str:
         """Clean and standardize the response"""
@@ -114,6 +119,77 @@ class MusicStructureRAG:
         return response
 
 
+class CachedMusicStructureRAG:
+    """LRU + semantic cache in front of MusicStructureRAG.query_rag"""
+
+    def __init__(self, rag: MusicStructureRAG, max_size: int = 128,
+                 similarity_threshold: float = 0.95):
+        self.rag = rag
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        # normalized style -> (unit embedding, structure)
+        self._cache: "OrderedDict[str, Tuple[np.ndarray, str]]" = OrderedDict()
+        # Queried from the streaming thread and the prefetch task
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(music_style: str) -> str:
+        return music_style.strip().lower()
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Embed text with the same model used by the RAG and normalize it"""
+        embedding = np.asarray(
+            self.rag.embedding_function.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _lookup_similar(self, embedding: np.ndarray) -> Optional[str]:
+        """Return the cached key whose embedding is closest above threshold"""
+        if not self._cache:
+            return None
+        keys = list(self._cache.keys())
+        matrix = np.stack([self._cache[key][0] for key in keys])
+        similarities = matrix @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] > self.similarity_threshold:
+            return keys[best]
+        return None
+
+    def query_rag(self, music_style: str) -> str:
+        """Return the cached structure for music_style, querying the RAG on miss"""
+        key = self._normalize(music_style)
+
+        # Exact match
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key][1]
+
+        # Approximate match on the style embedding
+        embedding = self._embed(key)
+        with self._lock:
+            similar_key = self._lookup_similar(embedding)
+            if similar_key is not None:
+                self._cache.move_to_end(similar_key)
+                return self._cache[similar_key][1]
+
+        # The RAG query runs outside the lock, it can take seconds
+        structure = self.rag.query_rag(music_style)
+        if structure == DEFAULT_STRUCTURE:
+            # Don't pin the fallback, the next call may reach the LLM
+            return structure
+        with self._lock:
+            self._cache[key] = (embedding, structure)
+            if len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        return structure
+
+    def prefetch(self, music_styles: List[str]):
+        """Warm the cache for a known set of styles"""
+        for music_style in music_styles:
+            self.query_rag(music_style)
+
+
 def main():
     """Main function for testing"""
     rag = MusicStructureRAG()
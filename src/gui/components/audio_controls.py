@@ -21,9 +21,13 @@ class AudioControls(QWidget):
         # Controls layout
         controls_layout = QHBoxLayout()
 
+        # System icons, looked up once and reused on state changes
+        self.play_icon = self.style().standardIcon(QStyle.SP_MediaPlay)
+        self.pause_icon = self.style().standardIcon(QStyle.SP_MediaPause)
+
         # Create buttons using system icons
         self.play_button = QPushButton()
-        self.play_button.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
+        self.play_button.setIcon(self.play_icon)
         self.play_button.clicked.connect(self.play_pause)
 
         self.stop_button = QPushButton()
@@ -140,9 +144,9 @@ class AudioControls(QWidget):
     def update_player_state(self, state):
         """Update button icons based on player state"""
         if state == QMediaPlayer.PlayingState:
-            self.play_button.setIcon(self.style().standardIcon(QStyle.SP_MediaPause))
+            self.play_button.setIcon(self.pause_icon)
         else:
-            self.play_button.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
+            self.play_button.setIcon(self.play_icon)
 
     @staticmethod
     def format_time(ms):
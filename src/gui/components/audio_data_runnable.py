@@ -0,0 +1,45 @@
+import logging
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class AudioDataSignals(QObject):
+    """Signaux d'AudioDataRunnable (un QRunnable n'est pas un QObject)"""
+    prepared = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class AudioDataRunnable(QRunnable):
+    """Analyse la composition et prépare les métadonnées audio dans le QThreadPool"""
+
+    def __init__(self, formatter, composition_text, musical_style, mood):
+        super().__init__()
+        self.formatter = formatter
+        self.composition_text = composition_text
+        self.musical_style = musical_style
+        self.mood = mood
+        self.signals = AudioDataSignals()
+
+    def run(self):
+        try:
+            # Parse and format data
+            parsed_data = self.formatter.parse_composition(self.composition_text)
+            logging.debug("Parsed composition data: %s", parsed_data)
+
+            # Generate audio export metadata
+            formatted_data = self.formatter.generate_audio_export_metadata(
+                lyrics=parsed_data.get('lyrics', {}),
+                chord_progression=parsed_data.get('chord_progression', {}),
+                song_structure=parsed_data.get('full_structure', {}),
+                musical_style=self.musical_style,
+                mood=self.mood
+            )
+            logging.debug("Formatted audio metadata: %s", formatted_data)
+
+            # Validate formatted data structure
+            if not formatted_data.get('music_metadata'):
+                raise ValueError("Missing required music metadata")
+
+            self.signals.prepared.emit(formatted_data)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
@@ -1,4 +1,3 @@
-from src.core.music_composition_experts import MusicCompositionExperts
 from PyQt5.QtCore import QThread, pyqtSignal
 
 class AudioGenerationThread(QThread):
@@ -32,6 +31,8 @@ class AudioGenerationThread(QThread):
             # Stop progress thread and emit completion
             self.progress_thread.stop()
             self.progress_thread.wait()
+            if self.isInterruptionRequested():
+                return
             self.progress_updated.emit(100, "Audio generation complete!")
             self.generation_complete.emit(result)
 
@@ -39,7 +40,8 @@ class AudioGenerationThread(QThread):
             if hasattr(self, 'progress_thread'):
                 self.progress_thread.stop()
                 self.progress_thread.wait()
-            self.generation_error.emit(str(e))
+            if not self.isInterruptionRequested():
+                self.generation_error.emit(str(e))
 
     def handle_progress_update(self, progress, message):
         """Handle progress updates from progress thread"""
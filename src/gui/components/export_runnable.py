@@ -0,0 +1,29 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class ExportSignals(QObject):
+    """Signaux d'ExportRunnable (un QRunnable n'est pas un QObject)"""
+    succeeded = pyqtSignal(str)
+    failed = pyqtSignal(str, str)
+
+
+class ExportRunnable(QRunnable):
+    """Tâche d'export JSON/TXT exécutée dans le QThreadPool"""
+
+    def __init__(self, formatter, composition_text, filepath, fmt):
+        super().__init__()
+        self.formatter = formatter
+        self.composition_text = composition_text
+        self.filepath = filepath
+        self.fmt = fmt
+        self.signals = ExportSignals()
+
+    def run(self):
+        try:
+            if self.fmt == 'json':
+                self.formatter.export_to_json(self.composition_text, self.filepath)
+            else:
+                self.formatter.export_to_txt(self.composition_text, self.filepath)
+            self.signals.succeeded.emit(self.fmt)
+        except Exception as e:
+            self.signals.failed.emit(self.fmt, str(e))
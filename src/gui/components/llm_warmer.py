@@ -0,0 +1,18 @@
+import logging
+
+from PyQt5.QtCore import QRunnable
+
+
+class LlmWarmer(QRunnable):
+    """Envoie une première requête au serveur LLM local dans le QThreadPool"""
+
+    def __init__(self, composer):
+        super().__init__()
+        self.composer = composer
+
+    def run(self):
+        try:
+            self.composer.warm_up()
+        except Exception as e:
+            # Le modèle sera chargé à la première composition
+            logging.warning(f"LLM warm-up failed: {str(e)}")
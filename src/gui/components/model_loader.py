@@ -0,0 +1,22 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class ModelLoaderSignals(QObject):
+    """Signaux de ModelLoader (un QRunnable n'est pas un QObject)"""
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class ModelLoader(QRunnable):
+    """Construit un modèle dans le QThreadPool sans bloquer l'interface"""
+
+    def __init__(self, factory):
+        super().__init__()
+        self.factory = factory
+        self.signals = ModelLoaderSignals()
+
+    def run(self):
+        try:
+            self.signals.loaded.emit(self.factory())
+        except Exception as e:
+            self.signals.failed.emit(str(e))
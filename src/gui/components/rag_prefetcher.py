@@ -0,0 +1,19 @@
+import logging
+
+from PyQt5.QtCore import QRunnable
+
+
+class RagPrefetcher(QRunnable):
+    """Interroge le RAG pour les styles du menu déroulant dans le QThreadPool"""
+
+    def __init__(self, rag, music_styles):
+        super().__init__()
+        self.rag = rag
+        self.music_styles = list(music_styles)
+
+    def run(self):
+        try:
+            self.rag.prefetch(self.music_styles)
+        except Exception as e:
+            # Les styles manquants seront récupérés au premier clic
+            logging.warning(f"RAG prefetch failed: {str(e)}")
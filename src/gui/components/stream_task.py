@@ -0,0 +1,64 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class StreamSignals(QObject):
+    """Signaux de StreamTask (un QRunnable n'est pas un QObject)"""
+    rag_ready = pyqtSignal(str)
+
+
+class StreamTask(QRunnable):
+    """Streaming de ChatGPT exécuté dans le QThreadPool
+
+    Les morceaux sont déposés dans `chunks` (une queue.SimpleQueue) que
+    l'interface vide sur un timer ; None marque la fin du flux.
+    """
+
+    def __init__(self, composer, function, rag, chunks, musical_style, song_theme, mood, language):
+        super().__init__()
+        # MusicCompositionExperts partagé, son client LLM est réutilisé d'un flux à l'autre
+        self.composer = composer
+        self.function = function
+        self.rag = rag
+        self.chunks = chunks
+        self.musical_style = musical_style
+        self.song_theme = song_theme
+        self.mood = mood
+        self.language = language
+        self.signals = StreamSignals()
+        self._stopped = False
+
+    def cancel(self):
+        """Demande l'arrêt du streaming, vérifié entre chaque morceau"""
+        self._stopped = True
+
+    def run(self):
+        try:
+            # Récupérer la structure via le RAG hors du thread GUI
+            structure = self.rag.query_rag(self.musical_style)
+            if self._stopped:
+                return
+            self.signals.rag_ready.emit(structure)
+
+            stream = getattr(self.composer, self.function)(
+                self.musical_style,
+                structure,
+                self.song_theme,
+                self.mood,
+                self.language
+            )
+
+            # Parcourir le flux de réponse
+            try:
+                for chunk in stream:
+                    if self._stopped:
+                        return
+                    if chunk:
+                        self.chunks.put(chunk)
+            finally:
+                # Fermer le générateur rend la connexion HTTP au pool si le flux est abandonné
+                stream.close()
+        except Exception as e:
+            if self._stopped:
+                return
+            self.chunks.put(f"Erreur : {str(e)}")
+        self.chunks.put(None)
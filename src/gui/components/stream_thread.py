@@ -1,27 +0,0 @@
-from src.core.music_composition_experts import MusicCompositionExperts
-from PyQt5.QtCore import QThread, pyqtSignal
-
-class StreamThread(QThread):
-    """Thread pour gérer le streaming de ChatGPT"""
-    chunk_ready = pyqtSignal(str)
-    stream_complete = pyqtSignal()
-
-    def __init__(self, function, *args):
-        super().__init__()
-        self.function = function
-        self.args = args
-
-    def run(self):
-        try:
-            music_composer = MusicCompositionExperts()
-            stream = getattr(music_composer, self.function)(*self.args)
-
-            # Parcourir le flux de réponse
-            for chunk in stream:
-                if chunk:
-                    self.chunk_ready.emit(chunk)
-
-            self.stream_complete.emit()
-        except Exception as e:
-            self.chunk_ready.emit(f"Erreur : {str(e)}")
-            self.stream_complete.emit()